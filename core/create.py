@@ -7,7 +7,6 @@ from typing import Tuple
 
 import torch
 import numpy as np
-from PIL import ImageFont
 from skimage.filters import gaussian
 from loguru import logger
 
@@ -21,20 +20,20 @@ from ..sup.util import EnumConvertType, \
     parse_param, zip_longest_fill
 
 from ..sup.image import MIN_IMAGE_SIZE, EnumImageType, \
-    image_mask_add, image_matte, cv2tensor, cv2tensor_full, tensor2cv, pil2cv
+    cv2tensor, cv2tensor_full, tensor2cv
 
 from ..sup.image.channel import channel_solid
 
 from ..sup.image.compose import EnumShapes, \
-    shape_ellipse, shape_polygon, shape_quad, image_mask_binary
+    shape_ellipse, shape_polygon, shape_quad, image_mask_matte
 
 from ..sup.image.adjust import EnumEdge, EnumScaleMode, EnumInterpolation, \
-    image_invert, image_rotate, image_scalefit, image_transform, image_translate
+    image_invert, image_scalefit, image_transform
 
 from ..sup.image.mapping import image_stereogram
 
 from ..sup.text import EnumAlignment, EnumJustify, \
-    font_names, text_autosize, text_draw
+    font_names, font_load, text_autosize, text_draw
 
 # ==============================================================================
 
@@ -80,8 +79,9 @@ Generate a constant image or mask of a specified size and color. It can be used
         for idx, (pA, matte, wihi, mode, sample) in enumerate(params):
             width, height = wihi
             if pA is None:
-                pA = channel_solid(width, height, matte, EnumImageType.BGRA)
-                images.append(cv2tensor_full(pA))
+                # convert one pixel and broadcast it, the stack below does the fill
+                pA = cv2tensor_full(channel_solid(1, 1, matte, EnumImageType.BGRA))
+                images.append([p.expand(height, width, *p.shape[2:]) for p in pA])
             else:
                 pA = tensor2cv(pA)
                 if mode != EnumScaleMode.MATTE:
@@ -134,8 +134,8 @@ Create n-sided polygons. These shapes can be customized by adjusting parameters
         for idx, (shape, sides, offset, angle, edge, size, wihi, color, matte, blur) in enumerate(params):
             width, height = wihi
             sizeX, sizeY = size
-            fill = color[:3][::-1]
-            back = matte[:3]
+            fill = color[:3]
+            back = matte[:3][::-1]
 
             match shape:
                 case EnumShapes.RECTANGLE | EnumShapes.SQUARE:
@@ -147,17 +147,12 @@ Create n-sided polygons. These shapes can be customized by adjusting parameters
                 case EnumShapes.POLYGON:
                     pA = shape_polygon(width, height, sizeX, sides, fill, back)
 
-            pA = pil2cv(pA)
             pA = image_transform(pA, offset, angle, edge=edge)
             if blur > 0:
                 # @TODO: Do blur on larger canvas to remove wrap bleed.
                 pA = (gaussian(pA, sigma=blur, channel_axis=2) * 255).astype(np.uint8)
 
-            pA = image_matte(pA, matte)
-            mask = image_mask_binary(pA)
-            pB = image_mask_add(pA, mask)
-            matte = image_matte(pB, matte)
-
+            pB, matte, mask = image_mask_matte(pA, matte)
             images.append([cv2tensor(pB), cv2tensor(matte), cv2tensor(mask, True)])
             pbar.update_absolute(idx)
         return [torch.stack(i) for i in zip(*images)]
@@ -247,8 +242,6 @@ Simulates depth perception in images by generating stereoscopic views. It accept
 class TextNode(JOVImageNode):
     NAME = "TEXT GEN (JOV) 📝"
     CATEGORY = f"JOVIMETRIX 🔺🟩🔵/{JOV_CATEGORY}"
-    FONTS = font_names()
-    FONT_NAMES = sorted(FONTS.keys())
     DESCRIPTION = """
 Generates images containing text based on parameters such as font, size, alignment, color, and position. Users can input custom text messages, select fonts from a list of available options, adjust font size, and specify the alignment and justification of the text. Additionally, the node provides options for auto-sizing text to fit within specified dimensions, controlling letter-by-letter rendering, and applying edge effects such as clipping and inversion.
 """
@@ -256,12 +249,13 @@ Generates images containing text based on parameters such as font, size, alignme
     @classmethod
     def INPUT_TYPES(cls) -> dict:
         d = super().INPUT_TYPES()
+        names = sorted(font_names().keys())
         d = deep_merge(d, {
             "optional": {
                 Lexicon.STRING: ("STRING", {"default": "jovimetrix", "multiline": True,
                                             "dynamicPrompts": False,
                                             "tooltips": "Your Message"}),
-                Lexicon.FONT: (cls.FONT_NAMES, {"default": cls.FONT_NAMES[0]}),
+                Lexicon.FONT: (names, {"default": names[0]}),
                 Lexicon.LETTER: ("BOOLEAN", {"default": False}),
                 Lexicon.AUTOSIZE: ("BOOLEAN", {"default": False}),
                 Lexicon.RGBA_A: ("VEC4INT", {"default": (255, 255, 255, 255), "rgb": True, "tooltips": "Color of the letters"}),
@@ -286,8 +280,9 @@ Generates images containing text based on parameters such as font, size, alignme
         return Lexicon._parse(d, cls)
 
     def run(self, **kw) -> Tuple[torch.Tensor, torch.Tensor]:
+        fonts = font_names()
         full_text = parse_param(kw, Lexicon.STRING, EnumConvertType.STRING, "jovimetrix")
-        font_idx = parse_param(kw, Lexicon.FONT, EnumConvertType.STRING, self.FONT_NAMES[0])
+        font_idx = parse_param(kw, Lexicon.FONT, EnumConvertType.STRING, sorted(fonts.keys())[0])
         autosize = parse_param(kw, Lexicon.AUTOSIZE, EnumConvertType.BOOLEAN, False)
         letter = parse_param(kw, Lexicon.LETTER, EnumConvertType.BOOLEAN, False)
         color = parse_param(kw, Lexicon.RGBA_A, EnumConvertType.VEC4INT, [(255,255,255,255)], 0, 255)
@@ -314,7 +309,7 @@ Generates images containing text based on parameters such as font, size, alignme
                 angle, edge, invert) in enumerate(params):
 
             width, height = wihi
-            font_name = self.FONTS[font_idx]
+            font_name = fonts[font_idx]
             full_text = str(full_text)
 
             if letter:
@@ -332,13 +327,16 @@ Generates images containing text based on parameters such as font, size, alignme
                 full_text = [full_text]
             font_size *= 2.5
 
-            font = ImageFont.truetype(font_name, font_size)
+            font = font_load(font_name, font_size)
+            # letter mode repeats characters; render each unique one once
+            glyphs = {}
             for ch in full_text:
-                img = text_draw(ch, font, width, height, align, justify, margin, line_spacing, color)
-                img = image_rotate(img, angle, edge=edge)
-                img = image_translate(img, pos, edge=edge)
-                if invert:
-                    img = image_invert(img, 1)
-                images.append(cv2tensor_full(img, matte))
+                if (img := glyphs.get(ch, None)) is None:
+                    img = text_draw(ch, font, width, height, align, justify, margin, line_spacing, color)
+                    img = image_transform(img, pos, angle, edge=edge, fold=True)
+                    if invert:
+                        img = image_invert(img, 1)
+                    img = glyphs[ch] = cv2tensor_full(img, matte)
+                images.append(img)
             pbar.update_absolute(idx)
         return [torch.stack(i) for i in zip(*images)]
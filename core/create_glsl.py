@@ -3,9 +3,11 @@ Jovimetrix - http://www.github.com/amorano/jovimetrix
 Creation
 """
 
+import os
 import sys
-from pathlib import Path
-from typing import Any, Tuple
+import json
+import hashlib
+from typing import Any, List, Tuple
 
 import torch
 from loguru import logger
@@ -22,18 +24,18 @@ from .. import JOV_TYPE_IMAGE, \
     comfy_message, deep_merge
 
 from ..sup.util import EnumConvertType, \
-    parse_param, parse_value
+    parse_param, parse_param_spec, parse_value
 
 from ..sup.image.adjust import EnumInterpolation, EnumScaleMode, \
     image_scalefit
 
 from ..sup.image import MIN_IMAGE_SIZE, \
-    image_convert, tensor2cv, cv2tensor_full
+    tensor2cv_batch, cv2tensor_full
 
-from ..sup.shader import JOV_ROOT_GLSL, GLSL_PROGRAMS, PROG_FRAGMENT, \
+from ..sup.shader import JOV_ROOT_GLSL, PROG_FRAGMENT, \
     PROG_VERTEX, PTYPE, \
     CompileException, EnumGLSLEdge, GLSLShader, \
-    shader_meta, load_file_glsl
+    glsl_programs, shader_meta, load_file_glsl
 
 from ..sup import shader as glsl_enums
 
@@ -41,20 +43,45 @@ from ..sup import shader as glsl_enums
 
 JOV_CATEGORY = "CREATE"
 
+# opt-in: link every dynamic shader once at load, on the importing thread, so
+# the driver/binary caches are hot before the first run. off by default as it
+# costs a glfw context and a link per shader on every startup
+JOV_GLSL_WARM = os.getenv("JOV_GLSL_WARM", 'false').strip().lower() in ('true', '1', 't')
+
+# node inputs that are never forwarded to the shader as uniforms
+_RESERVED = frozenset((Lexicon.MODE, Lexicon.WH, Lexicon.SAMPLE, Lexicon.MATTE,
+                       Lexicon.BATCH, Lexicon.TIME, Lexicon.FPS, Lexicon.WAIT,
+                       Lexicon.RESET, Lexicon.EDGE, Lexicon.EDGE_X, Lexicon.EDGE_Y,
+                       Lexicon.PROG_VERT, Lexicon.PROG_FRAG))
+
 # ==============================================================================
 
+# serialized program listing + etag, rebuilt only when glsl_programs rescans
+# (it hands back a new index whenever a program directory changed)
+_GLSL_LIST: dict = {}
+
+def glsl_list_body() -> Tuple[bytes, str]:
+    programs = glsl_programs()
+    if _GLSL_LIST.get('programs', None) is not programs:
+        ret = {k:[kk for kk, vv in v.items() if kk not in ['NONE'] and vv not in [None]]
+               for k, v in programs.items()}
+        body = json.dumps(ret).encode()
+        _GLSL_LIST.update({'programs': programs, 'body': body,
+                           'etag': f'"{hashlib.sha1(body).hexdigest()}"'})
+    return _GLSL_LIST['body'], _GLSL_LIST['etag']
+
 try:
     @PromptServer.instance.routes.get("/jovimetrix/glsl")
     async def jovimetrix_glsl_list(request) -> Any:
-        ret = {k:[kk for kk, vv in v.items() \
-                  if kk not in ['NONE'] and vv not in [None] and Path(vv).exists()]
-               for k, v in GLSL_PROGRAMS.items()}
-        return web.json_response(ret)
+        body, etag = glsl_list_body()
+        if request.headers.get('If-None-Match', None) == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
 
     @PromptServer.instance.routes.get("/jovimetrix/glsl/{prog}/{shader}")
     async def jovimetrix_glsl_raw(request) -> Any:
         prog = request.match_info["prog"]
-        if (program := GLSL_PROGRAMS.get(prog, None)) is None:
+        if (program := glsl_programs().get(prog, None)) is None:
             return web.Response(text=f"no program {prog}")
 
         shader = request.match_info["shader"].replace("|", "/")
@@ -69,7 +96,7 @@ try:
         json_data = await request.json()
         response = {k:None for k in json_data.keys()}
         for who in response.keys():
-            if (programs := GLSL_PROGRAMS.get(who, None)) is None:
+            if (programs := glsl_programs().get(who, None)) is None:
                 logger.warning(f"no program type {who}")
                 continue
             fname = json_data[who]
@@ -84,6 +111,17 @@ except Exception as e:
 
 class GLSLNodeBase(JOVImageNode):
     CATEGORY = f"JOVIMETRIX 🔺🟩🔵/GLSL"
+    # parse_param arguments for the fixed inputs, bound once with the class
+    PARAM_SPEC = (
+        (Lexicon.BATCH, EnumConvertType.INT, 0, 0, 1048576),
+        (Lexicon.TIME, EnumConvertType.FLOAT, 0),
+        (Lexicon.MODE, EnumScaleMode, EnumScaleMode.MATTE.name),
+        (Lexicon.WH, EnumConvertType.VEC2INT, [(512, 512)], MIN_IMAGE_SIZE),
+        (Lexicon.SAMPLE, EnumInterpolation, EnumInterpolation.LANCZOS4.name),
+        (Lexicon.MATTE, EnumConvertType.VEC4INT, [(0, 0, 0, 255)], 0, 255),
+        (Lexicon.EDGE_X, EnumGLSLEdge, EnumGLSLEdge.CLAMP.name),
+        (Lexicon.EDGE_Y, EnumGLSLEdge, EnumGLSLEdge.CLAMP.name),
+    )
 
     @classmethod
     def INPUT_TYPES(cls) -> dict:
@@ -106,16 +144,8 @@ class GLSLNodeBase(JOVImageNode):
         self.__delta = 0
 
     def run(self, ident, **kw) -> Tuple[torch.Tensor]:
-        batch = parse_param(kw, Lexicon.BATCH, EnumConvertType.INT, 0, 0, 1048576)[0]
-        delta = parse_param(kw, Lexicon.TIME, EnumConvertType.FLOAT, 0)[0]
-
         # everybody wang comp tonight
-        mode = parse_param(kw, Lexicon.MODE, EnumScaleMode, EnumScaleMode.MATTE.name)[0]
-        wihi = parse_param(kw, Lexicon.WH, EnumConvertType.VEC2INT, [(512, 512)], MIN_IMAGE_SIZE)[0]
-        sample = parse_param(kw, Lexicon.SAMPLE, EnumInterpolation, EnumInterpolation.LANCZOS4.name)[0]
-        matte = parse_param(kw, Lexicon.MATTE, EnumConvertType.VEC4INT, [(0, 0, 0, 255)], 0, 255)[0]
-        edge_x = parse_param(kw, Lexicon.EDGE_X, EnumGLSLEdge, EnumGLSLEdge.CLAMP.name)[0]
-        edge_y = parse_param(kw, Lexicon.EDGE_Y, EnumGLSLEdge, EnumGLSLEdge.CLAMP.name)[0]
+        batch, delta, mode, wihi, sample, matte, edge_x, edge_y = parse_param_spec(kw, self.PARAM_SPEC)
         edge = (edge_x, edge_y)
 
         try:
@@ -127,16 +157,14 @@ class GLSLNodeBase(JOVImageNode):
             logger.error(e)
             return
 
-        variables = kw.copy()
-        for p in [Lexicon.MODE, Lexicon.WH, Lexicon.SAMPLE, Lexicon.MATTE, Lexicon.BATCH, Lexicon.TIME, Lexicon.FPS, Lexicon.EDGE]:
-            variables.pop(p, None)
+        variables = {k: v for k, v in kw.items() if k not in _RESERVED}
 
         self.__glsl.fps = parse_param(kw, Lexicon.FPS, EnumConvertType.INT, 24, 1, 120)[0]
         if batch > 0 or self.__delta != delta:
             self.__delta = delta
         step = 1. / self.__glsl.fps
 
-        images = []
+        images = None
         vars = {}
         batch = max(1, batch)
         firstImage = None
@@ -145,7 +173,7 @@ class GLSLNodeBase(JOVImageNode):
             for k, var in variables.items():
                 if isinstance(var, (torch.Tensor)):
                     batch = max(batch, var.shape[0])
-                    var = [image_convert(tensor2cv(v), 4) for v in var]
+                    var = list(tensor2cv_batch(var))
                     if firstImage is None:
                         firstImage = var[0]
                 elif isinstance(var, (list, tuple,)):
@@ -167,11 +195,17 @@ class GLSLNodeBase(JOVImageNode):
             img = self.__glsl.render(self.__delta, edge, **vars)
             if mode != EnumScaleMode.MATTE:
                 img = image_scalefit(img, w, h, mode, sample)
-            images.append(cv2tensor_full(img, matte))
+            if images is None:
+                # every frame renders at the same size, write into one batch
+                h, w = img.shape[:2]
+                images = [torch.empty((batch, h, w, 4)),
+                          torch.empty((batch, h, w, 3)),
+                          torch.empty((batch, h, w))]
+            cv2tensor_full(img, matte, [i[idx] for i in images])
             self.__delta += step
             comfy_message(ident, "jovi-glsl-time", {"id": ident, "t": self.__delta})
             pbar.update_absolute(idx)
-        return [torch.stack(i) for i in zip(*images)]
+        return images
 
 class GLSLNode(GLSLNodeBase):
     NAME = "GLSL (JOV) 🍩"
@@ -262,9 +296,10 @@ class GLSLNodeDynamic(GLSLNodeBase):
 
 def import_dynamic() -> Tuple[str,...]:
     ret = []
+    warm = []
     sort = 10000
     root = str(JOV_ROOT_GLSL)
-    for name, fname in GLSL_PROGRAMS['fragment'].items():
+    for name, fname in glsl_programs()['fragment'].items():
         if (shader := load_file_glsl(fname)) is None:
             logger.error(f"missing shader file {fname}")
             continue
@@ -297,4 +332,28 @@ def import_dynamic() -> Tuple[str,...]:
 
         sort += 10
         ret.append((class_name, class_def,))
+        warm.append((class_name, shader,))
+
+    if JOV_GLSL_WARM and len(warm):
+        # glfw is main thread only, so this stays on the thread loading nodes
+        glsl_warm(warm)
     return ret
+
+def glsl_warm(programs:List[Tuple[str, str]]) -> None:
+    """Link each fragment program once in a throwaway context, which fills
+    the on-disk program binary cache before the first node run."""
+    try:
+        glsl = GLSLShader()
+    except Exception as e:
+        logger.warning(f"GLSL warm skipped: {e}")
+        return
+
+    count = 0
+    for class_name, shader in programs:
+        try:
+            glsl.fragment = shader
+            count += 1
+        except Exception as e:
+            logger.debug(f"{class_name}: {e}")
+    del glsl
+    logger.info(f"GLSL warmed {count} of {len(programs)} programs")
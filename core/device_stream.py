@@ -146,6 +146,8 @@ Capture frames from various sources such as URLs, cameras, monitors, windows, or
         self.__deviceType = None
         self.__url = ""
         self.__capturing = 0
+        # FIT resize target, reused while the output size holds
+        self.__scale = None
         a = torch.zeros((MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, 4), dtype=torch.uint8, device="cpu")
         e = torch.zeros((MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, 3), dtype=torch.uint8, device="cpu")
         m = torch.ones((MIN_IMAGE_SIZE, MIN_IMAGE_SIZE, 1), dtype=torch.uint8, device="cpu")
@@ -246,18 +248,24 @@ Capture frames from various sources such as URLs, cameras, monitors, windows, or
 
                 self.__device
 
+                count = -1
                 for idx in range(batch_size):
-                    img = self.__device.frame
-                    if img is None:
+                    # a frame already converted this batch is reused, not rescaled
+                    if (fresh := self.__device.count) == count and len(images):
+                        images.append(images[-1])
+                    elif (img := self.__device.frame) is None:
                         images.append(self.__empty)
                     else:
+                        count = fresh
                         img = cv2.cvtColor(img, cv2.COLOR_RGB2BGRA)
-                        if type(self.__device) == MediaStreamDevice:
-                            if orient in [EnumCanvasOrientation.FLIPX, EnumCanvasOrientation.FLIPXY]:
-                                img = cv2.flip(img, 1)
-                            if orient in [EnumCanvasOrientation.FLIPY, EnumCanvasOrientation.FLIPXY]:
-                                img = cv2.flip(img, 0)
-                        if mode != EnumScaleMode.MATTE:
+                        if type(self.__device) == MediaStreamDevice and orient != EnumCanvasOrientation.NORMAL:
+                            flip = {EnumCanvasOrientation.FLIPX: 1,
+                                    EnumCanvasOrientation.FLIPY: 0}.get(orient, -1)
+                            img = cv2.flip(img, flip, dst=img)
+                        if mode == EnumScaleMode.FIT:
+                            # tensors below are copies, so the resize target can be reused
+                            img = self.__scale = image_scalefit(img, width, height, mode, sample, matte, self.__scale)
+                        elif mode != EnumScaleMode.MATTE:
                             img = image_scalefit(img, width, height, mode, sample, matte)
                         images.append(cv2tensor_full(img))
                     pbar.update_absolute(idx)
@@ -130,11 +130,20 @@ def cv2tensor(image: TYPE_IMAGE, grayscale: bool=False) -> torch.Tensor:
     image = image.astype(np.float32) / 255.0
     return torch.from_numpy(image) #.unsqueeze(0)
 
-def cv2tensor_full(image: TYPE_IMAGE, matte:TYPE_PIXEL=(0,0,0,255)) -> Tuple[torch.Tensor, ...]:
+def cv2tensor_full(image: TYPE_IMAGE, matte:TYPE_PIXEL=(0,0,0,255),
+                   out:Tuple[torch.Tensor, ...]=None) -> Tuple[torch.Tensor, ...]:
+    """Convert a CV2 image to RGBA, RGB and MASK tensors.
+    If `out` is given (RGBA, RGB, MASK views) the results are written in place.
+    """
 
     rgba = image_convert(image, 4)
     rgb = image_matte(rgba, matte)[...,:3]
     mask = image_mask(image)
+    if out is not None:
+        for src, dst in zip((rgba, rgb, mask), out):
+            np.divide(src, 255.0, out=dst.numpy(), dtype=np.float32)
+        return out
+
     rgba = torch.from_numpy(rgba.astype(np.float32) / 255.0)
     rgb = torch.from_numpy(rgb.astype(np.float32) / 255.0)
     mask = torch.from_numpy(mask.astype(np.float32) / 255.0)
@@ -157,14 +166,16 @@ def image2bgr(image: TYPE_IMAGE) -> Tuple[TYPE_IMAGE, TYPE_IMAGE, int]:
 
 def pil2cv(image: Image.Image) -> TYPE_IMAGE:
     """Convert a PIL Image to a CV2 Matrix."""
-    new_image = np.array(image, dtype=np.uint8)
+    # asarray already copies (PIL hands over tobytes()), but read-only; the
+    # color swap then writes the contiguous, writable result
+    new_image = np.asarray(image, dtype=np.uint8)
     if new_image.ndim == 2:
-        pass
+        return new_image.copy()
     elif new_image.shape[2] == 3:
-        new_image = new_image[:, :, ::-1]
+        return cv2.cvtColor(new_image, cv2.COLOR_RGB2BGR)
     elif new_image.shape[2] == 4:
-        new_image = new_image[:, :, [2, 1, 0, 3]]
-    return new_image
+        return cv2.cvtColor(new_image, cv2.COLOR_RGBA2BGRA)
+    return new_image.copy()
 
 def pil2tensor(image: Image.Image) -> torch.Tensor:
     """Convert a PIL Image to a Torch Tensor."""
@@ -185,6 +196,25 @@ def tensor2cv(tensor: torch.Tensor, invert_mask:bool=True) -> TYPE_IMAGE:
     tensor = tensor.cpu().numpy()
     return np.clip(255.0 * tensor, 0, 255).astype(np.uint8)
 
+def tensor2cv_batch(tensor: torch.Tensor, invert_mask:bool=True) -> TYPE_IMAGE:
+    """Convert a batch (BxHxWxC or a BxHxW mask batch) into one uint8 RGBA ndarray.
+    Channels are padded with vectorized writes, a few frames at a time.
+    """
+    if tensor.ndim < 4:
+        tensor = tensor.unsqueeze(-1)
+
+    if (cc := tensor.shape[-1]) == 1 and invert_mask:
+        tensor = 1. - tensor
+
+    image = tensor.float().cpu().numpy()
+    rgba = np.empty(image.shape[:-1] + (4,), dtype=np.uint8)
+    # quantize in chunks so the float scratch stays small for long batches
+    for i in range(0, len(image), 16):
+        chunk = np.clip(255. * image[i:i+16], 0, 255)
+        rgba[i:i+16, ..., :3] = chunk[..., :3] if cc > 2 else chunk[..., :1]
+        rgba[i:i+16, ..., 3] = chunk[..., 3] if cc > 3 else 255
+    return rgba
+
 def tensor2pil(tensor: torch.Tensor) -> Image.Image:
     """Convert a torch Tensor to a PIL Image.
     Tensor should be HxWxC [no batch].
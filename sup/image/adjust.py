@@ -3,6 +3,7 @@ Jovimetrix - http://www.github.com/amorano/jovimetrix
 Support
 """
 
+import functools
 from enum import Enum
 from typing import List, Tuple
 
@@ -329,16 +330,26 @@ def image_quantize(image:TYPE_IMAGE, levels:int=256, iterations:int=10,
     centers = np.uint8(centers)
     return centers[labels.flatten()].reshape(image.shape)
 
+@functools.lru_cache(maxsize=64)
+def rotation_matrix(center:Tuple[int, int], angle:float) -> np.ndarray:
+    """Clockwise rotation about center, shared across frames of a batch."""
+    M = cv2.getRotationMatrix2D(center, -angle, 1.0)
+    M.setflags(write=False)
+    return M
+
 def image_rotate(image: TYPE_IMAGE, angle: float, center:TYPE_fCOORD2D=(0.5, 0.5),
                  edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
 
+    if angle % 360 == 0:
+        return image
+
     h, w = image.shape[:2]
     if edge != EnumEdge.CLIP:
         image = image_edge_wrap(image, edge=edge)
 
     height, width = image.shape[:2]
     c = (int(width * center[0]), int(height * center[1]))
-    M = cv2.getRotationMatrix2D(c, -angle, 1.0)
+    M = rotation_matrix(c, angle)
     image = cv2.warpAffine(image, M, (width, height), flags=cv2.INTER_LINEAR)
     if edge != EnumEdge.CLIP:
         image = image_crop_center(image, w, h)
@@ -364,7 +375,13 @@ def image_scale(image: TYPE_IMAGE, scale:TYPE_fCOORD2D=(1.0, 1.0),
 def image_scalefit(image: TYPE_IMAGE, width: int, height:int,
                 mode:EnumScaleMode=EnumScaleMode.MATTE,
                 sample:EnumInterpolation=EnumInterpolation.LANCZOS4,
-                matte:TYPE_PIXEL=(0,0,0,0)) -> TYPE_IMAGE:
+                matte:TYPE_PIXEL=(0,0,0,0), out:TYPE_IMAGE=None) -> TYPE_IMAGE:
+    """Scale an image into width x height. For FIT, `out` may be a buffer
+    of the result's shape and type to resize into instead of allocating."""
+
+    # already the target size -- every mode but the matte composites is identity
+    if image.shape[:2] == (height, width) and mode not in [EnumScaleMode.MATTE, EnumScaleMode.RESIZE_MATTE]:
+        mode = None
 
     match mode:
         case EnumScaleMode.MATTE | EnumScaleMode.RESIZE_MATTE:
@@ -384,7 +401,7 @@ def image_scalefit(image: TYPE_IMAGE, width: int, height:int,
             image = image_crop_center(image, width, height)
 
         case EnumScaleMode.FIT:
-            image = cv2.resize(image, (width, height), interpolation=sample.value)
+            image = cv2.resize(image, (width, height), dst=out, interpolation=sample.value)
 
     if image.ndim == 2:
         image = np.expand_dims(image, -1)
@@ -482,7 +499,7 @@ def image_translate(image: TYPE_IMAGE, offset: TYPE_fCOORD2D=(0.0, 0.0),
 def image_transform(image: TYPE_IMAGE, offset:TYPE_fCOORD2D=(0.0, 0.0),
                     angle:float=0, scale:TYPE_fCOORD2D=(1.0, 1.0),
                     sample:EnumInterpolation=EnumInterpolation.LANCZOS4,
-                    edge:EnumEdge=EnumEdge.CLIP) -> TYPE_IMAGE:
+                    edge:EnumEdge=EnumEdge.CLIP, fold:bool=False) -> TYPE_IMAGE:
     sX, sY = scale
     if sX < 0:
         image = cv2.flip(image, 1)
@@ -492,7 +509,14 @@ def image_transform(image: TYPE_IMAGE, offset:TYPE_fCOORD2D=(0.0, 0.0),
         sY = -sY
     if sX != 1. or sY != 1.:
         image = image_scale(image, (sX, sY), sample, edge)
-    if angle != 0:
+    if fold and edge == EnumEdge.CLIP and angle % 360 != 0 and (offset[0] != 0. or offset[1] != 0.):
+        # one warp instead of two. not the same output: the two step path clips
+        # to the canvas after rotating, here rotated corners can translate back in
+        height, width = image.shape[:2]
+        M = rotation_matrix((int(width * 0.5), int(height * 0.5)), angle) + \
+            np.array([[0, 0, offset[0] * width], [0, 0, offset[1] * height]])
+        return cv2.warpAffine(image, M, (width, height), flags=cv2.INTER_LINEAR)
+    if angle % 360 != 0:
         image = image_rotate(image, angle, edge=edge)
     if offset[0] != 0. or offset[1] != 0.:
         image = image_translate(image, offset, edge)
@@ -9,7 +9,7 @@ from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw
+from numba import jit, prange
 from blendmodes.blend import BlendType, blendLayers
 
 from loguru import logger
@@ -268,6 +268,55 @@ def image_mask_binary(image: TYPE_IMAGE) -> TYPE_IMAGE:
         mask = np.expand_dims(mask, -1)
     return mask.astype(np.uint8)
 
+@jit(nopython=True, parallel=True, cache=True)
+def _image_mask_matte(image: np.ndarray, matte: np.ndarray, alpha: int, out_image: np.ndarray,
+                      out_matte: np.ndarray, out_mask: np.ndarray) -> None:
+    height, width = image.shape[:2]
+    for y in prange(height):
+        for x in range(width):
+            b, g, r = image[y, x, 0], image[y, x, 1], image[y, x, 2]
+            # same fixed point weights as cv2.COLOR_BGR2GRAY
+            gray = (b * 1868 + g * 9617 + r * 4899 + 8192) >> 14
+            mask = 255 if alpha > 0 and gray > 0 else 0
+            out_image[y, x, 0] = b
+            out_image[y, x, 1] = g
+            out_image[y, x, 2] = r
+            out_image[y, x, 3] = mask
+            if mask:
+                out_matte[y, x, 0] = b
+                out_matte[y, x, 1] = g
+                out_matte[y, x, 2] = r
+            else:
+                out_matte[y, x, 0] = matte[0]
+                out_matte[y, x, 1] = matte[1]
+                out_matte[y, x, 2] = matte[2]
+            out_matte[y, x, 3] = mask
+            out_mask[y, x, 0] = mask
+
+def image_mask_matte(image: TYPE_IMAGE, matte: TYPE_PIXEL=(0, 0, 0, 255)) -> Tuple[TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE]:
+    """
+    Mask the non-black pixels of an image and composite it over a matte, in one pass.
+
+    Same result as `image_matte` -> `image_mask_binary` -> `image_mask_add` -> `image_matte`
+    without the intermediate full size buffers.
+
+    Args:
+        image (TYPE_IMAGE): Input image, the first three channels are used.
+        matte (TYPE_PIXEL): RGBA matte color; an alpha of zero masks out everything.
+
+    Returns:
+        Tuple[TYPE_IMAGE, TYPE_IMAGE, TYPE_IMAGE]: The image with the binary mask as alpha,
+        the image composited over the matte and the binary mask.
+    """
+    image = image_convert(image, 3)
+    height, width = image.shape[:2]
+    out_image = np.empty((height, width, 4), dtype=np.uint8)
+    out_matte = np.empty((height, width, 4), dtype=np.uint8)
+    out_mask = np.empty((height, width, 1), dtype=np.uint8)
+    color = np.array(matte[:3], dtype=np.uint8)
+    _image_mask_matte(np.ascontiguousarray(image), color, int(matte[3]), out_image, out_matte, out_mask)
+    return out_image, out_matte, out_mask
+
 def image_by_size(image_list: List[TYPE_IMAGE],
                   enumSize: EnumImageBySize=EnumImageBySize.LARGEST) -> Tuple[TYPE_IMAGE, int, int]:
 
@@ -369,30 +418,82 @@ def image_stack(image_list: List[TYPE_IMAGE],
 # === SHAPE ===
 # ==============================================================================
 
+@jit(nopython=True, parallel=True, cache=True)
+def _shape_ellipse(image: np.ndarray, cx: float, cy: float, rx: float, ry: float,
+                   fill: np.ndarray) -> None:
+    height, width = image.shape[:2]
+    # only visit the rows/columns the ellipse can cover; exact test stays per pixel
+    y0 = max(0, int(cy - ry) - 1)
+    y1 = min(height, int(cy + ry) + 2)
+    for y in prange(y0, y1):
+        dy = (y + 0.5 - cy) / ry
+        dy *= dy
+        if dy > 1.:
+            continue
+        span = rx * np.sqrt(1. - dy)
+        for x in range(max(0, int(cx - span) - 1), min(width, int(cx + span) + 2)):
+            dx = (x + 0.5 - cx) / rx
+            if dx * dx + dy <= 1.:
+                image[y, x, :] = fill
+
+@jit(nopython=True, parallel=True, cache=True)
+def _shape_polygon(image: np.ndarray, points: np.ndarray, fill: np.ndarray) -> None:
+    height, width = image.shape[:2]
+    count = points.shape[0]
+    # pixels outside the polygon's bounding box can never be inside it
+    left = max(0, int(np.floor(points[:, 0].min())) - 1)
+    right = min(width, int(np.ceil(points[:, 0].max())) + 1)
+    top = max(0, int(np.floor(points[:, 1].min())) - 1)
+    bottom = min(height, int(np.ceil(points[:, 1].max())) + 1)
+    for y in prange(top, bottom):
+        py = y + 0.5
+        for x in range(left, right):
+            px = x + 0.5
+            # winding number test
+            wind = 0
+            for i in range(count):
+                j = (i + 1) % count
+                x0, y0 = points[i, 0], points[i, 1]
+                x1, y1 = points[j, 0], points[j, 1]
+                side = (x1 - x0) * (py - y0) - (px - x0) * (y1 - y0)
+                if y0 <= py:
+                    if y1 > py and side > 0:
+                        wind += 1
+                elif y1 <= py and side < 0:
+                    wind -= 1
+            if wind != 0:
+                image[y, x, :] = fill
+
 def shape_ellipse(width: int, height: int, sizeX:float=1., sizeY:float=1.,
-                  fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> Image:
+                  fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> TYPE_IMAGE:
     sizeX = max(0.5, sizeX / 2 + 0.5)
     sizeY = max(0.5, sizeY / 2 + 0.5)
-    xy = [(width * (1. - sizeX), height * (1. - sizeY)),(width * sizeX, height * sizeY)]
-    image = Image.new("RGB", (width, height), back)
-    ImageDraw.Draw(image).ellipse(xy, fill=fill)
+    image = np.full((height, width, 3), back, dtype=np.uint8)
+    rx = width * (sizeX - 0.5)
+    ry = height * (sizeY - 0.5)
+    if rx > 0 and ry > 0:
+        _shape_ellipse(image, width * 0.5, height * 0.5, rx, ry, np.array(fill, dtype=np.uint8))
     return image
 
 def shape_quad(width: int, height: int, sizeX:float=1., sizeY:float=1.,
-               fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> Image:
+               fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> TYPE_IMAGE:
     sizeX = max(0.5, sizeX / 2 + 0.5)
     sizeY = max(0.5, sizeY / 2 + 0.5)
-    xy = [(width * (1. - sizeX), height * (1. - sizeY)),(width * sizeX, height * sizeY)]
-    image = Image.new("RGB", (width, height), back)
-    ImageDraw.Draw(image).rectangle(xy, fill=fill)
+    image = np.full((height, width, 3), back, dtype=np.uint8)
+    x1, x2 = int(round(width * (1. - sizeX))), int(round(width * sizeX))
+    y1, y2 = int(round(height * (1. - sizeY))), int(round(height * sizeY))
+    image[max(0, y1):y2 + 1, max(0, x1):x2 + 1] = fill
     return image
 
 def shape_polygon(width: int, height: int, size: float=1., sides: int=3,
-                  fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> Image:
+                  fill:TYPE_PIXEL=255, back:TYPE_PIXEL=0) -> TYPE_IMAGE:
     size = max(0.00001, size)
     r = min(width, height) * size * 0.5
-    xy = (width * 0.5, height * 0.5, r)
-    image = Image.new("RGB", (width, height), back)
-    d = ImageDraw.Draw(image)
-    d.regular_polygon(xy, sides, fill=fill)
+    image = np.full((height, width, 3), back, dtype=np.uint8)
+    # same vertex layout as PIL regular_polygon -- flat bottom edge
+    step = 360. / sides
+    angle = np.radians(270. - 0.5 * step + np.arange(sides) * step)
+    points = np.stack([width * 0.5 + r * np.cos(angle),
+                       height * 0.5 - r * np.sin(angle)], axis=-1)
+    _shape_polygon(image, points, np.array(fill, dtype=np.uint8))
     return image
@@ -8,6 +8,7 @@ from typing import Any, List, Tuple
 
 import cv2
 import numpy as np
+from numba import jit, prange
 
 from loguru import logger
 
@@ -44,6 +45,20 @@ def image_mirror_mandela(imageA: np.ndarray, imageB: np.ndarray) -> Tuple[np.nda
     imageB = np.vstack([top, bottom])
     return imageA, imageB
 
+@jit(nopython=True, parallel=True, cache=True)
+def _stereogram_rows(image: np.ndarray, depth: np.ndarray, out: np.ndarray,
+                     pattern_width: int, divisions: int, shift: float) -> None:
+    # each pixel copies from earlier in its own row, so only the rows are parallel
+    height, width = out.shape[:2]
+    for y in prange(height):
+        for x in range(width):
+            if x < pattern_width:
+                out[y, x, :] = image[y, x, :]
+            else:
+                offset = depth[y, x] // divisions
+                pos = (x - pattern_width + int(shift * offset)) % width
+                out[y, x, :] = out[y, pos, :]
+
 def image_stereogram(image: TYPE_IMAGE, depth: TYPE_IMAGE, divisions:int=8,
                      mix:float=0.33, gamma:float=0.33, shift:float=1.) -> TYPE_IMAGE:
     height, width = depth.shape[:2]
@@ -56,17 +71,8 @@ def image_stereogram(image: TYPE_IMAGE, depth: TYPE_IMAGE, divisions:int=8,
     image = cv2.addWeighted(image, 1. - mix, noise, mix, 0)
 
     pattern_width = width // divisions
-    # shift -= 1
-    for y in range(height):
-        for x in range(width):
-            if x < pattern_width:
-                out[y, x] = image[y, x]
-            else:
-                # out[y, x] = out[y, x - pattern_width + int(shift * invert)]
-                offset = depth[y, x][0] // divisions
-                pos = x - pattern_width + int(shift * offset)
-                # pos = max(-pattern_width, min(pattern_width, pos))
-                out[y, x] = out[y, pos]
+    depth = np.ascontiguousarray(depth[..., 0]).astype(np.int64)
+    _stereogram_rows(np.ascontiguousarray(image), depth, out, pattern_width, divisions, shift)
     return out
 
 # ==============================================================================
@@ -8,7 +8,9 @@ Blended from old ModernGL implementation + Audio_Scheduler & Fill Node Pack
 import os
 import re
 import sys
-from pathlib import Path
+import json
+import struct
+import hashlib
 from enum import Enum, EnumMeta as EnumType
 from typing import Any, Dict, Tuple
 
@@ -77,45 +79,27 @@ class EnumGLSLColorConvert(Enum):
     XYZ2LAB = 32
 
 JOV_ROOT_GLSL = ROOT / 'res' / 'glsl'
-GLSL_PROGRAMS = {
-    "vertex": {  },
-    "fragment": { }
-}
+JOV_CACHE_GLSL = ROOT / 'cache' / 'glsl'
+# program binaries kept on disk, the least recently used are dropped past this
+JOV_CACHE_GLSL_MAX = 256
+JOV_INDEX_GLSL = ROOT / 'cache' / 'glsl_index.json'
 
-GLSL_PROGRAMS['vertex'].update({str(f.relative_to(JOV_ROOT_GLSL).as_posix()):
-                                str(f) for f in Path(JOV_ROOT_GLSL).rglob('*.vert')})
 USER_GLSL = ROOT / 'glsl'
 USER_GLSL.mkdir(parents=True, exist_ok=True)
-if (USER_GLSL := os.getenv("JOV_GLSL", str(USER_GLSL))) is not None:
-    GLSL_PROGRAMS['vertex'].update({str(f.relative_to(USER_GLSL).as_posix()):
-                                    str(f) for f in Path(USER_GLSL).rglob('*.vert')})
-
-GLSL_PROGRAMS['fragment'].update({str(f.relative_to(JOV_ROOT_GLSL).as_posix()):
-                                  str(f) for f in Path(JOV_ROOT_GLSL).rglob('*.frag')})
-if USER_GLSL is not None:
-    GLSL_PROGRAMS['fragment'].update({str(f.relative_to(USER_GLSL).as_posix()):
-                                      str(f) for f in Path(USER_GLSL).rglob('*.frag')})
+USER_GLSL = os.getenv("JOV_GLSL", str(USER_GLSL))
 
 try:
-    prog = GLSL_PROGRAMS['vertex'].pop('.lib/_.vert')
-    PROG_VERTEX = load_file(prog)
+    PROG_VERTEX = load_file(JOV_ROOT_GLSL / '.lib/_.vert')
+    PROG_FRAGMENT = load_file(JOV_ROOT_GLSL / '.lib/_.frag')
+    if PROG_VERTEX is None or PROG_FRAGMENT is None:
+        raise FileNotFoundError(JOV_ROOT_GLSL / '.lib')
 except Exception as e:
     logger.error(e)
-    raise Exception("failed load default vertex program .lib/_.vert")
-
-try:
-    prog = GLSL_PROGRAMS['fragment'].pop('.lib/_.frag')
-    PROG_FRAGMENT = load_file(prog)
-except Exception as e:
-    logger.error(e)
-    raise Exception("failed load default fragment program .lib/_.frag")
+    raise Exception("failed load default programs .lib/_.vert .lib/_.frag")
 
 PROG_HEADER = load_file(JOV_ROOT_GLSL / '.lib/_.head')
 PROG_FOOTER = load_file(JOV_ROOT_GLSL / '.lib/_.foot')
 
-logger.info(f"  vertex programs: {len(GLSL_PROGRAMS['vertex'])}")
-logger.info(f"fragment programs: {len(GLSL_PROGRAMS['fragment'])}")
-
 RE_INCLUDE = re.compile(r"^\s+?#include\s+?([A-Za-z\_\-\.\\\/]{3,})$", re.MULTILINE)
 RE_VARIABLE = re.compile(r"uniform\s+(\w+)\s+(\w+);\s*(?:\/\/\s*([^;|]*))?\s*(?:;\s*([^;|]*))?\s*(?:;\s*([^;|]*))?\s*(?:;\s*([^;|]*))?\s*(?:;\s*([^;|]*))?\s*(?:\|\s*(.*))?$", re.MULTILINE)
 RE_SHADER_META = re.compile(r"^\/\/\s?([A-Za-z_]{3,}):\s?(.+)$", re.MULTILINE)
@@ -191,6 +175,60 @@ class GLSLShader:
         # logger.debug(f"{shader_type} compiled")
         return shader
 
+    def __program_key(self, vertex:str, fragment:str) -> str:
+        """Driver specific key for the linked program binary cache."""
+        key = hashlib.sha1(vertex.encode())
+        key.update(b'\0')
+        key.update(fragment.encode())
+        for name in [gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION]:
+            key.update(gl.glGetString(name) or b'')
+        return key.hexdigest()
+
+    def __program_binary_load(self, key:str) -> int | None:
+        fname = JOV_CACHE_GLSL / f"{key}.bin"
+        if not fname.exists():
+            return None
+
+        program = None
+        try:
+            data = fname.read_bytes()
+            fmt = struct.unpack('<I', data[:4])[0]
+            blob = np.frombuffer(data[4:], dtype=np.uint8)
+            program = gl.glCreateProgram()
+            gl.glProgramBinary(program, fmt, blob, blob.size)
+            if gl.glGetProgramiv(program, gl.GL_LINK_STATUS) == gl.GL_TRUE:
+                logger.debug(f"program binary {key}")
+                # mtime is the last use, for the pruning in __program_binary_save
+                os.utime(fname)
+                return program
+        except Exception as e:
+            logger.debug(e)
+
+        # stale binary (driver update) -- fall back to a source compile
+        if program:
+            gl.glDeleteProgram(program)
+        return None
+
+    def __program_binary_save(self, key:str, program:int) -> None:
+        try:
+            size = gl.glGetProgramiv(program, gl.GL_PROGRAM_BINARY_LENGTH)
+            if size < 1:
+                return
+            length = np.zeros(1, dtype=np.int32)
+            fmt = np.zeros(1, dtype=np.uint32)
+            blob = np.zeros(size, dtype=np.uint8)
+            gl.glGetProgramBinary(program, size, length, fmt, blob)
+            JOV_CACHE_GLSL.mkdir(parents=True, exist_ok=True)
+            with open(JOV_CACHE_GLSL / f"{key}.bin", 'wb') as f:
+                f.write(struct.pack('<I', int(fmt[0])))
+                f.write(blob[:int(length[0])].tobytes())
+            # every edited shader leaves a binary behind, keep the newest used
+            blobs = sorted(JOV_CACHE_GLSL.glob('*.bin'), key=lambda f: f.stat().st_mtime)
+            for fname in blobs[:-JOV_CACHE_GLSL_MAX]:
+                fname.unlink(missing_ok=True)
+        except Exception as e:
+            logger.debug(e)
+
     def __init_program(self, vertex:str=None, fragment:str=None, force:bool=False) -> None:
         vertex = self.__source_vertex_raw if vertex is None else vertex
         if vertex is None:
@@ -210,18 +248,26 @@ class GLSLShader:
         except Exception as e:
             pass
 
-        self.__source_vertex = self.__compile_shader(vertex, gl.GL_VERTEX_SHADER)
         fragment_full = PROG_HEADER + fragment + PROG_FOOTER
-        self.__source_fragment = self.__compile_shader(fragment_full, gl.GL_FRAGMENT_SHADER)
-
-        self.__program = gl.glCreateProgram()
-        gl.glAttachShader(self.__program, self.__source_vertex)
-        gl.glAttachShader(self.__program, self.__source_fragment)
-        gl.glLinkProgram(self.__program)
-        if gl.glGetProgramiv(self.__program, gl.GL_LINK_STATUS) != gl.GL_TRUE:
-            log = gl.glGetProgramInfoLog(self.__program).decode()
-            logger.error(f"Program linking error: {log}")
-            raise RuntimeError(log)
+        key = self.__program_key(vertex, fragment_full)
+        if (program := self.__program_binary_load(key)) is None:
+            self.__source_vertex = self.__compile_shader(vertex, gl.GL_VERTEX_SHADER)
+            self.__source_fragment = self.__compile_shader(fragment_full, gl.GL_FRAGMENT_SHADER)
+
+            program = gl.glCreateProgram()
+            gl.glAttachShader(program, self.__source_vertex)
+            gl.glAttachShader(program, self.__source_fragment)
+            try:
+                gl.glProgramParameteri(program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+            except Exception as e:
+                pass
+            gl.glLinkProgram(program)
+            if gl.glGetProgramiv(program, gl.GL_LINK_STATUS) != gl.GL_TRUE:
+                log = gl.glGetProgramInfoLog(program).decode()
+                logger.error(f"Program linking error: {log}")
+                raise RuntimeError(log)
+            self.__program_binary_save(key, program)
+        self.__program = program
 
         self.__source_fragment_raw = fragment
         self.__source_vertex_raw = vertex
@@ -412,11 +458,13 @@ class GLSLShader:
                 if not isinstance(val, (np.ndarray,)):
                     val = self.__empty_image
 
-                # @TODO: could cache this ?
+                # batch inputs arrive as uint8 RGBA, float only for the upload
                 val = image_convert(val, 4)
-                val = val[::-1,:]
-                val = val.astype(np.float32) / 255.0
-                val = cv2.resize(val, self.__size, interpolation=cv2.INTER_LINEAR)
+                val = np.ascontiguousarray(val[::-1,:])
+                if val.dtype != np.float32:
+                    val = val.astype(np.float32) / 255.0
+                if val.shape[1::-1] != self.__size:
+                    val = cv2.resize(val, self.__size, interpolation=cv2.INTER_LINEAR)
                 #
                 gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA32F, self.__size[0], self.__size[1], 0, gl.GL_RGBA, gl.GL_FLOAT, val)
                 gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
@@ -457,6 +505,81 @@ class GLSLShader:
 
         return self.__last_frame
 
+def glsl_scan(root:str, path:str, programs:Dict[str, Dict[str, str]], dirs:Dict[str, float]) -> None:
+    """Collect the vertex and fragment programs under path, keyed relative to root."""
+    dirs[path] = os.stat(path).st_mtime
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir():
+                glsl_scan(root, entry.path, programs, dirs)
+                continue
+            if entry.name.endswith('.vert'):
+                who = 'vertex'
+            elif entry.name.endswith('.frag'):
+                who = 'fragment'
+            else:
+                continue
+            name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+            programs[who][name] = entry.path
+
+# the index in use; every call re-checks it against the directory mtimes
+_GLSL_INDEX: Dict[str, Any] = {}
+
+def glsl_index_current(index:Dict[str, Any], roots:list) -> bool:
+    """Is the index for these roots, with none of its directories changed since."""
+    try:
+        return index.get('roots', None) == roots and \
+            all(os.stat(d).st_mtime == m for d, m in index['dirs'].items())
+    except Exception as e:
+        return False
+
+def glsl_programs() -> Dict[str, Dict[str, str]]:
+    """All of the vertex and fragment programs, internal and user.
+
+    The scan is persisted with the mtime of every scanned directory. A program
+    added or removed changes its directory's mtime, so each call compares
+    those and only rescans when one moved.
+    """
+    roots = [str(JOV_ROOT_GLSL)]
+    if USER_GLSL is not None:
+        roots.append(USER_GLSL)
+
+    if glsl_index_current(_GLSL_INDEX, roots):
+        return _GLSL_INDEX['programs']
+
+    try:
+        with open(JOV_INDEX_GLSL, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if glsl_index_current(index, roots):
+            _GLSL_INDEX.update(index)
+            return index['programs']
+    except Exception as e:
+        pass
+
+    programs = {
+        "vertex": {  },
+        "fragment": { }
+    }
+    dirs = {}
+    for root in roots:
+        if os.path.isdir(root):
+            glsl_scan(root, root, programs, dirs)
+
+    programs['vertex'].pop('.lib/_.vert', None)
+    programs['fragment'].pop('.lib/_.frag', None)
+    logger.info(f"  vertex programs: {len(programs['vertex'])}")
+    logger.info(f"fragment programs: {len(programs['fragment'])}")
+
+    index = {'roots': roots, 'dirs': dirs, 'programs': programs}
+    _GLSL_INDEX.update(index)
+    try:
+        JOV_INDEX_GLSL.parent.mkdir(parents=True, exist_ok=True)
+        with open(JOV_INDEX_GLSL, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+    except Exception as e:
+        logger.warning(e)
+    return programs
+
 def shader_meta(shader: str) -> Dict[str, Any]:
     ret = {}
     for match in RE_SHADER_META.finditer(shader):
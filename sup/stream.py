@@ -4,20 +4,22 @@ Media Stream Support
 """
 
 import os
+import re
 import ssl
 import sys
 import json
 import time
 import array
+import asyncio
 import threading
 from typing import Any, List, Tuple
-from itertools import repeat
+from concurrent.futures import Future
 from configparser import ConfigParser
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import cv2
 import mss
-import mss.tools
+import requests
 import numpy as np
 from PIL import Image, ImageGrab
 
@@ -39,6 +41,28 @@ if JOV_SPOUT:
 else:
     logger.warning("SKIPPING SPOUT GL SUPPORT")
 
+# libjpeg-turbo direct, when available, for the MJPEG server
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    _TJ = TurboJPEG()
+    logger.info("TURBOJPEG SUPPORT")
+except Exception as e:
+    _TJ = None
+    logger.debug(f"NO TURBOJPEG SUPPORT {e}")
+
+# FFmpeg decode through PyAV, opt-in, for network sources
+JOV_STREAM_AV = os.getenv("JOV_STREAM_AV", 'false').strip().lower() in ('true', '1', 't')
+JOV_STREAM_HWACCEL = os.getenv("JOV_STREAM_HWACCEL", '').strip()
+
+if JOV_STREAM_AV:
+    try:
+        import av
+        logger.info("PYAV SUPPORT")
+    except Exception as e:
+        JOV_STREAM_AV = False
+        logger.error("NO PYAV SUPPORT")
+        logger.error(e)
+
 from .. import JOV_DOCKERENV, Singleton
 
 from .image import TYPE_PIXEL, \
@@ -61,6 +85,33 @@ try:
     JOV_STREAM_PORT = int(os.getenv("JOV_STREAM_PORT", JOV_STREAM_PORT))
 except Exception as e:
     logger.error(str(e))
+JOV_STREAM_QUALITY = 95
+try:
+    JOV_STREAM_QUALITY = min(100, max(1, int(os.getenv("JOV_STREAM_QUALITY", JOV_STREAM_QUALITY))))
+except Exception as e:
+    logger.error(str(e))
+
+# streams already run in parallel on their own threads; OpenCV's own thread pool
+# on top of that oversubscribes the cores. process wide, so opt-in (1 = serial)
+try:
+    if (JOV_CV_THREADS := os.getenv("JOV_CV_THREADS", '').strip()) != '':
+        cv2.setNumThreads(int(JOV_CV_THREADS))
+        logger.info(f"OPENCV THREADS {cv2.getNumThreads()}")
+except Exception as e:
+    logger.error(str(e))
+
+# live rtsp sources go through GStreamer, when OpenCV was built with it, so the
+# appsink only ever holds the newest frame. http(s) can just as well be a plain
+# file, which must play at its own pace and loop, so it stays with OpenCV
+JOV_GSTREAMER = re.search(r'GStreamer:\s*YES', cv2.getBuildInformation()) is not None
+
+def gstreamer_pipeline(url: str) -> str | None:
+    """appsink pipeline that drops stale frames, None if the url is not rtsp."""
+    if not url.lower().startswith('rtsp://'):
+        return None
+    # quoted, so spaces, '!' and quotes in credentials or queries stay in the url
+    location = '"' + url.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return f'rtspsrc location={location} latency=0 ! decodebin ! videoconvert ! video/x-raw,format=BGR ! appsink drop=true max-buffers=1 sync=false'
 
 # ==============================================================================
 # === SCREEN / WINDOW CAPTURE ===
@@ -268,6 +319,11 @@ def camera_list() -> list:
 class MediaStreamBase:
 
     TIMEOUT = 5.
+    # streams whose capture and callback never block (SHARED) tick together on
+    # one loop thread; sources that block on I/O or decode keep their own thread
+    SHARED = False
+    LOOP = None
+    LOCK = threading.Lock()
 
     def __init__(self, fps:float=30) -> None:
         self.__quit = False
@@ -276,10 +332,36 @@ class MediaStreamBase:
         self.__fps = fps
         self.__timeout = None
         self.__frame = None
-        self.__thread = threading.Thread(target=self.__run, daemon=True)
-        self.__thread.start()
+        self.__count = 0
+        if self.SHARED:
+            future = asyncio.run_coroutine_threadsafe(self.__run(), MediaStreamBase.loop())
+        else:
+            future = Future()
+            self.__thread = threading.Thread(target=self.__main, args=(future,), daemon=True)
+            self.__thread.start()
+        future.add_done_callback(self.__done)
+
+    @classmethod
+    def loop(cls) -> asyncio.AbstractEventLoop:
+        """The scheduling loop shared by every stream, started on first use."""
+        with MediaStreamBase.LOCK:
+            if MediaStreamBase.LOOP is None:
+                MediaStreamBase.LOOP = asyncio.new_event_loop()
+                threading.Thread(target=MediaStreamBase.LOOP.run_forever, daemon=True).start()
+        return MediaStreamBase.LOOP
+
+    def __main(self, future: Future) -> None:
+        try:
+            future.set_result(asyncio.run(self.__run()))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def __done(self, future: Future) -> None:
+        if not future.cancelled() and (e := future.exception()) is not None:
+            logger.opt(exception=e).error(f"{self} stopped")
+            self.end()
 
-    def __run(self) -> None:
+    async def __run(self) -> None:
         while not self.__quit:
 
             delta = 1. / self.__fps
@@ -304,6 +386,8 @@ class MediaStreamBase:
                 # call the run capture frame command on subclasses
                 newframe = self.callback()
                 if newframe is not None:
+                    if newframe is not self.__frame:
+                        self.__count += 1
                     self.__frame = newframe
                     self.__timeout = None
 
@@ -313,7 +397,10 @@ class MediaStreamBase:
                 logger.warning(f"TIMEOUT")
 
             waste = max(waste - time.perf_counter(), 0)
-            time.sleep(waste)
+            # nothing to produce while paused, just check back now and then
+            if self.__paused:
+                waste = max(waste, 0.1)
+            await asyncio.sleep(waste)
 
         logger.info(f"STOPPED")
         self.end()
@@ -352,6 +439,11 @@ class MediaStreamBase:
     def frame(self) -> Any:
         return self.__frame
 
+    @property
+    def count(self) -> int:
+        """Number of new frames published; read it before `frame`."""
+        return self.__count
+
     @property
     def fps(self) -> float:
         return self.__fps
@@ -362,6 +454,9 @@ class MediaStreamBase:
 
 class MediaStreamStatic(MediaStreamBase):
     """A stream coming from ComfyUI."""
+
+    SHARED = True
+
     def __init__(self) -> None:
         self.image = None
         super().__init__()
@@ -372,17 +467,27 @@ class MediaStreamStatic(MediaStreamBase):
 class MediaStreamURL(MediaStreamBase):
     """A media point (could be a camera index)."""
     def __init__(self, url:int|str, fps:float=30) -> None:
-        self.__url = url
-        try: self.__url = int(url)
-        except: pass
+        self.__url = int(url) if isinstance(url, str) and url.strip().isdigit() else url
         self.__source = None
+        # isOpened() only changes on open/release, so keep the answer
+        self.__opened = False
         self.__last = None
+        self.__decode = 0
         super().__init__(fps)
 
     def callback(self) -> Tuple[bool, Any]:
         ret = False
+        result = None
         try:
-            ret, result = self.__source.read()
+            # grab always, to keep the source drained; pay for the decode
+            # (retrieve) at most once a frame period, with a little slack so
+            # tick jitter never skips a frame that is due
+            if (ret := self.__source.grab()):
+                if (now := time.perf_counter()) < self.__decode and self.__last is not None:
+                    return self.__last
+                self.__decode = now + 0.9 / self.fps
+                # always a fresh array: readers may still hold the last one
+                ret, result = self.__source.retrieve()
         except:
             pass
 
@@ -413,7 +518,15 @@ class MediaStreamURL(MediaStreamBase):
     def capture(self) -> bool:
         if self.captured:
             return True
-        self.__source = cv2.VideoCapture(self.__url, cv2.CAP_ANY)
+        self.__source = None
+        if JOV_GSTREAMER and isinstance(self.__url, str) and \
+            (pipeline := gstreamer_pipeline(self.__url)) is not None:
+            self.__source = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+            if not self.__source.isOpened():
+                self.__source = None
+        if self.__source is None:
+            self.__source = cv2.VideoCapture(self.__url, cv2.CAP_ANY)
+        self.__opened = self.__source.isOpened()
         if self.captured:
             time.sleep(0.3)
             return True
@@ -421,11 +534,10 @@ class MediaStreamURL(MediaStreamBase):
 
     @property
     def captured(self) -> bool:
-        if self.__source is None:
-            return False
-        return self.__source.isOpened()
+        return self.__opened
 
     def release(self) -> None:
+        self.__opened = False
         if self.__source is not None:
             self.__source.release()
         super().release()
@@ -446,7 +558,7 @@ class MediaStreamDevice(MediaStreamURL):
     def zoom(self, val: float) -> None:
         if self.source is None:
             return
-        self.__zoom = np.clip(val, 0, 1)
+        self.__zoom = max(0., min(1., float(val)))
         val = 100 + 300 * self.__zoom
         self.source.set(cv2.CAP_PROP_ZOOM, val)
 
@@ -459,7 +571,7 @@ class MediaStreamDevice(MediaStreamURL):
         if self.source is None:
             return
         # -10 to -1 range
-        self.__exposure = np.clip(val, 0, 1)
+        self.__exposure = max(0., min(1., float(val)))
         val = -10 + 9 * self.__exposure
         self.source.set(cv2.CAP_PROP_EXPOSURE, val)
 
@@ -471,10 +583,203 @@ class MediaStreamDevice(MediaStreamURL):
     def focus(self, val: float) -> None:
         if self.source is None:
             return
-        self.__focus = np.clip(val, 0, 1)
+        self.__focus = max(0., min(1., float(val)))
         val = 255 * self.__focus
         self.source.set(cv2.CAP_PROP_FOCUS, val)
 
+class MediaStreamMJPEG(MediaStreamURL):
+    """An HTTP multipart JPEG source. The source JPEG bytes are kept as-is for
+    the streaming server; pixels are only decoded when `frame` is being read.
+    Responses that are not multipart are handed to OpenCV, like any URL."""
+
+    # chunks read per tick, so a slow part never parks a worker for long
+    CHUNKS = 64
+    # no boundary within this many bytes means it is not the stream we expect
+    BUFFER_MAX = 16 << 20
+
+    def __init__(self, url:str, fps:float=30) -> None:
+        self.__response = None
+        self.__chunks = None
+        self.__boundary = b''
+        self.__buffer = bytearray()
+        # boundary offsets found in the buffer, and where the next search starts
+        self.__marks = []
+        self.__scan = 0
+        self.__jpeg = None
+        self.__decoded = None
+        self.__last = None
+        self.__lock = threading.Lock()
+        super().__init__(url, fps)
+
+    def callback(self) -> Any:
+        if self.__response is None:
+            return super().callback()
+
+        size = len(self.__boundary)
+        try:
+            for _ in range(self.CHUNKS):
+                if len(self.__marks) > 1:
+                    break
+                self.__buffer += next(self.__chunks)
+                # only the new bytes, plus a boundary's worth of overlap, can hold a new mark
+                while (at := self.__buffer.find(self.__boundary, self.__scan)) > -1:
+                    self.__marks.append(at)
+                    self.__scan = at + size
+                self.__scan = max(self.__scan, len(self.__buffer) - size + 1)
+                if len(self.__buffer) > self.BUFFER_MAX:
+                    raise StreamMissingException(f"no part boundary in {self.BUFFER_MAX} bytes")
+            # newest complete part wins, anything older is dropped
+            if len(self.__marks) > 1:
+                part = self.__buffer[self.__marks[-2] + size:self.__marks[-1]]
+                del self.__buffer[:self.__marks[-1]]
+                self.__marks = [0]
+                self.__scan = size
+                start, end = part.find(b'\xff\xd8'), part.rfind(b'\xff\xd9')
+                if -1 < start < end:
+                    self.__jpeg = bytes(part[start:end + 2])
+        except StopIteration:
+            # source hung up; release so the next tick reconnects
+            logger.warning(f"{self.url} ended")
+            self.release()
+            return None
+        except Exception as e:
+            logger.error(e)
+            self.release()
+            return None
+
+        # the JPEG itself is published; `frame` decodes it for pixel readers
+        return self.__jpeg
+
+    @property
+    def frame(self) -> Any:
+        if not isinstance(frame := super().frame, bytes):
+            return frame
+        with self.__lock:
+            if frame is not self.__decoded:
+                self.__last = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+                self.__decoded = frame
+            return self.__last
+
+    @property
+    def jpeg(self) -> bytes | None:
+        """Newest source JPEG, untouched."""
+        return self.__jpeg
+
+    def capture(self) -> bool:
+        if self.captured:
+            return True
+        try:
+            response = requests.get(self.url, stream=True, timeout=5)
+            content = response.headers.get('Content-Type', '')
+            if content.startswith('multipart/') and 'boundary=' in content:
+                # some servers repeat the '--' in the parameter, match without it
+                boundary = content.split('boundary=')[-1].split(';')[0].strip().strip('"')
+                self.__boundary = boundary.lstrip('-').encode()
+                self.__chunks = response.iter_content(chunk_size=16384)
+                self.__response = response
+                return True
+            response.close()
+            logger.info(f"{self.url} is not multipart ({content}), using OpenCV")
+        except Exception as e:
+            logger.error(e)
+        return super().capture()
+
+    @property
+    def captured(self) -> bool:
+        return self.__response is not None or super().captured
+
+    def release(self) -> None:
+        if self.__response is not None:
+            self.__response.close()
+            self.__response = None
+        self.__chunks = None
+        self.__buffer = bytearray()
+        self.__marks = []
+        self.__scan = 0
+        self.__jpeg = None
+        super().release()
+
+if JOV_STREAM_AV:
+    class MediaStreamAV(MediaStreamBase):
+        """A network media point decoded by FFmpeg (PyAV), hardware decoded
+        when JOV_STREAM_HWACCEL names a device type (cuda, vaapi, ...)."""
+
+        # most queued frames decoded, but never converted, in one tick
+        DRAIN_MAX = 120
+
+        def __init__(self, url:str, fps:float=30) -> None:
+            self.__url = url
+            self.__container = None
+            self.__decode = None
+            self.__last = None
+            # wall clock time of the stream's zero timestamp
+            self.__epoch = None
+            super().__init__(fps)
+
+        def callback(self) -> Any:
+            try:
+                frame = next(self.__decode)
+                # a tick slower than the source would fall further behind every
+                # frame: drain the queued frames older than a tick, newest wins
+                if frame.time is not None:
+                    now = time.perf_counter()
+                    if self.__epoch is None:
+                        self.__epoch = now - frame.time
+                    late = now - self.__epoch - 1. / self.fps
+                    for _ in range(self.DRAIN_MAX):
+                        if frame.time >= late:
+                            break
+                        frame = next(self.__decode)
+                    else:
+                        # never caught up (source clock drift), start over from here
+                        self.__epoch = now - frame.time
+                # to_ndarray repacks padded line strides into a tight BGR frame
+                self.__last = frame.to_ndarray(format='bgr24')
+            except StopIteration:
+                # finite sources loop, like MediaStreamURL
+                try:
+                    self.__epoch = None
+                    self.__container.seek(0)
+                    self.__decode = self.__container.decode(video=0)
+                except Exception as e:
+                    logger.debug(e)
+            except Exception as e:
+                logger.debug(e)
+            return self.__last
+
+        @property
+        def url(self) -> str:
+            return self.__url
+
+        def capture(self) -> bool:
+            if self.captured:
+                return True
+            kw = {}
+            if JOV_STREAM_HWACCEL:
+                try:
+                    from av.codec.hwaccel import HWAccel
+                    kw['hwaccel'] = HWAccel(device_type=JOV_STREAM_HWACCEL)
+                except Exception as e:
+                    logger.warning(e)
+            try:
+                self.__container = av.open(self.__url, **kw)
+                self.__decode = self.__container.decode(video=0)
+            except Exception as e:
+                logger.error(e)
+                self.__container = None
+            return self.captured
+
+        @property
+        def captured(self) -> bool:
+            return self.__container is not None
+
+        def release(self) -> None:
+            if self.__container is not None:
+                self.__container.close()
+                self.__container = None
+            self.__epoch = None
+            super().release()
+
 if JOV_SPOUT:
     class MediaStreamSpout(MediaStreamBase):
         """Capture from SpoutGL stream."""
@@ -494,7 +799,7 @@ if JOV_SPOUT:
             if self.__spout.isUpdated():
                 self.__width = self.__spout.getSenderWidth()
                 self.__height = self.__spout.getSenderHeight()
-                self.__buffer = array.array('B', repeat(0, self.__width * self.__height * 4))
+                self.__buffer = array.array('B', bytes(self.__width * self.__height * 4))
             result = self.__spout.receiveImage(self.__buffer, GL.GL_RGBA, False, 0)
             if self.__buffer is not None and result: # and not SpoutGL.helpers.isBufferEmpty(self.__buffer):
                 self.__last = np.asarray(self.__buffer, dtype=np.uint8).reshape((self.__height, self.__width, 4))
@@ -518,6 +823,9 @@ if JOV_SPOUT:
 
 class MediaStreamFile(MediaStreamBase):
     """A file served from a local file using file:// as the 'uri'."""
+
+    SHARED = True
+
     def __init__(self, url:str) -> None:
         self.__image, mask = image_load(url)[0]
         super().__init__()
@@ -553,12 +861,18 @@ class StreamManager(metaclass=Singleton):
                     StreamManager.STREAM[url] = MediaStreamStatic()
                 elif isinstance(url, str) and url.lower().startswith("file://"):
                     StreamManager.STREAM[url] = MediaStreamFile(url[7:])
+                elif isinstance(url, str) and url.lower().startswith(('http://', 'https://')) and \
+                    re.search(r'mjpe?g', url.lower()) is not None:
+                    StreamManager.STREAM[url] = MediaStreamMJPEG(url, fps=fps)
+                elif JOV_STREAM_AV and isinstance(url, str) and \
+                    url.lower().startswith(('rtsp://', 'rtmp://', 'http://', 'https://')):
+                    StreamManager.STREAM[url] = MediaStreamAV(url, fps=fps)
 
                 else:
-                    try:
+                    if isinstance(url, int) or (isinstance(url, str) and url.strip().isdigit()):
                         url = int(url)
                         StreamManager.STREAM[url] = MediaStreamDevice(url, fps=fps)
-                    except Exception as _:
+                    else:
                         StreamManager.STREAM[url] = MediaStreamURL(url, fps=fps)
 
                 stream = StreamManager.STREAM[url]
@@ -580,6 +894,22 @@ class StreamManager(metaclass=Singleton):
 # === SERVER ===
 # ==============================================================================
 
+def jpeg_encode(frame: np.ndarray, quality: int=95) -> bytes:
+    """Encode a BGR(A) frame as JPEG bytes, through TurboJPEG if it loaded."""
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+    if _TJ is not None and frame.ndim == 3:
+        # BGR straight to YCbCr 4:2:0 -- same chroma layout as OpenCV's default
+        return _TJ.encode(np.ascontiguousarray(frame), quality=quality,
+                          pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+MJPEG_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+
+def mjpeg_part(jpeg: bytes) -> bytes:
+    """One complete multipart/x-mixed-replace frame, ready for a single write."""
+    return b''.join([MJPEG_HEADER % len(jpeg), jpeg, b'\r\n'])
+
 class StreamingHandler(BaseHTTPRequestHandler):
     def __init__(self, outputs, *arg, **kw) -> None:
         self.__outputs = outputs
@@ -596,20 +926,20 @@ class StreamingHandler(BaseHTTPRequestHandler):
             self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
             self.end_headers()
 
+            seq = -1
             while True:
                 try:
-                    if (frame := data['b']) is not None:
-                        _, jpeg = cv2.imencode('.jpg', frame)
-                        self.wfile.write(b'--frame\r\n')
-                        self.send_header('Content-Type', 'image/jpeg')
-                        self.send_header('Content-Length', len(jpeg))
-                        self.end_headers()
-                        self.wfile.write(jpeg.tobytes())
-                        self.wfile.write(b'\r\n')
+                    # frames are encoded once by the capture thread; wait for the next,
+                    # or resend the last each second so dead clients are noticed
+                    with data['cv']:
+                        data['cv'].wait_for(lambda: data['seq'] != seq, timeout=1.)
+                        seq = data['seq']
+                        part = data['m']
+                    if part is not None:
+                        self.wfile.write(part)
                 except Exception as e:
                     logger.error(str(e))
                     break
-                time.sleep(0.001)
 
         elif key == 'jovimetrix':
             self.send_response(200)
@@ -624,10 +954,20 @@ class StreamingHandler(BaseHTTPRequestHandler):
 
 class StreamingServer(metaclass=Singleton):
     OUT = {}
+    # (name, entry) pairs for the capture thread, rebuilt only when OUT changes
+    SNAPSHOT = []
+    LOCK = threading.Lock()
+    FPS_MAX = 120
+    # JPEG quality served to clients; 85 roughly halves bytes and encode time
+    # for a small visible loss, 95 matches the OpenCV default
+    QUALITY = JOV_STREAM_QUALITY
 
     @classmethod
     def endpointAdd(cls, name: str, stream: MediaStreamDevice) -> None:
-        StreamingServer.OUT[name] = {'_': stream, 'b': None}
+        with StreamingServer.LOCK:
+            StreamingServer.OUT[name] = {'_': stream, 'b': None, 'm': None, 'n': -1, 'seq': 0,
+                                         'cv': threading.Condition()}
+            StreamingServer.SNAPSHOT = list(StreamingServer.OUT.items())
         logger.info(f"ENDPOINT_ADD ({name})")
 
     def __init__(self, host: str='', port: int=JOV_STREAM_PORT) -> None:
@@ -661,11 +1001,29 @@ class StreamingServer(metaclass=Singleton):
 
     def __capture(self) -> None:
         while True:
-            current = StreamingServer.OUT.copy()
-            for k, v in current.items():
-                if (device := v['_']) is not None:
-                    StreamingServer.OUT[k]['b'] = device.frame
-            time.sleep(0.001)
+            rate = 1
+            for k, v in StreamingServer.SNAPSHOT:
+                if (device := v['_']) is None:
+                    continue
+                rate = max(rate, getattr(device, 'fps', 30))
+                # MJPEG sources pass their JPEG through, no decode/encode
+                if (jpeg := getattr(device, 'jpeg', None)) is not None:
+                    if jpeg is v['b']:
+                        continue
+                    frame, part = jpeg, mjpeg_part(jpeg)
+                # encode only frames that changed, once for every client
+                elif (count := device.count) == v['n'] or (frame := device.frame) is None:
+                    continue
+                else:
+                    v['n'] = count
+                    part = mjpeg_part(jpeg_encode(frame, StreamingServer.QUALITY))
+                with v['cv']:
+                    v['b'] = frame
+                    v['m'] = part
+                    v['seq'] += 1
+                    v['cv'].notify_all()
+            # poll at twice the fastest source rate instead of spinning
+            time.sleep(0.5 / min(rate, StreamingServer.FPS_MAX))
 
 # ==============================================================================
 # === SPOUT SERVER ===
@@ -5,6 +5,7 @@ TEXT support
 
 from enum import Enum
 import textwrap
+import functools
 from typing import List, Tuple
 
 from matplotlib import font_manager
@@ -29,7 +30,9 @@ class EnumJustify(Enum):
 
 # ==============================================================================
 
+@functools.lru_cache(maxsize=1)
 def font_names() -> List[str]:
+    # font scan is slow; do it on first use, not at import
     try:
         mgr = font_manager.FontManager()
         return {font.name: font.fname for font in mgr.ttflist}
@@ -37,15 +40,29 @@ def font_names() -> List[str]:
         logger.warn(e)
     return {}
 
+@functools.lru_cache(maxsize=64)
+def font_load(font:str, size:float) -> ImageFont.FreeTypeFont:
+    # face loading is not free; batches almost always repeat (font, size)
+    return ImageFont.truetype(font, size)
+
 def text_size(draw: ImageDraw, text:str, font:ImageFont) -> Tuple[int, int]:
     bbox = draw.textbbox((0, 0), text, font=font)
     text_width = bbox[2] - bbox[0]
     text_height = bbox[3] - bbox[1]
     return text_width, text_height
 
+# glyph metrics only depend on (font, text), so measure on one scratch surface
+_TEXT_DRAW = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+@functools.lru_cache(maxsize=1024)
+def _text_size(font:str, size:float, text:str) -> Tuple[int, int]:
+    return text_size(_TEXT_DRAW, text, font_load(font, size))
+
+def text_size_cached(font:ImageFont.FreeTypeFont, text:str) -> Tuple[int, int]:
+    # keyed on what the face was loaded from, so the cache never pins faces
+    return _text_size(font.path, font.size, text)
+
 def text_autosize(text:str, font:str, width:int, height:int, columns:int=0) -> Tuple[str, int, int, int]:
-    img = Image.new("L", (width, height))
-    draw = ImageDraw.Draw(img)
     if columns != 0:
         text = text.split('\n')
         lines = []
@@ -54,14 +71,24 @@ def text_autosize(text:str, font:str, width:int, height:int, columns:int=0) -> T
             lines.extend(line)
         text = '\n'.join(lines)
 
-    font_size = 1
     test_text = text if columns == 0 else ' ' * columns
-    while 1:
-        ttf = ImageFont.truetype(font, font_size)
-        w, h = text_size(draw, test_text, ttf)
-        if w >= width or h >= height:
-            break
-        font_size += 1
+
+    def measure(font_size:int) -> Tuple[int, int]:
+        # probe faces are throwaway; keep them out of the font and metric
+        # caches, where they would evict what the batch actually reuses
+        return text_size(_TEXT_DRAW, test_text, ImageFont.truetype(font, font_size))
+
+    # smallest size that fills the width or height: double to bracket, then bisect
+    low, font_size = 0, 1
+    while (size := measure(font_size))[0] < width and size[1] < height:
+        low, font_size = font_size, font_size * 2
+    while font_size - low > 1:
+        mid = (low + font_size) // 2
+        if (probe := measure(mid))[0] >= width or probe[1] >= height:
+            font_size, size = mid, probe
+        else:
+            low = mid
+    w, h = size
     # * 0.6543
     return text, font_size * 0.33, w, h
 
@@ -76,7 +103,7 @@ def text_draw(full_text: str, font: ImageFont,
     draw = ImageDraw.Draw(img)
     text_lines = full_text.split('\n')
     count = len(text_lines)
-    height_max = text_size(draw, full_text, font)[1] + line_spacing * (count-1)
+    height_max = text_size_cached(font, full_text)[1] + line_spacing * (count-1)
     height_delta = height_max / count
     # find the bounding box of this
 
@@ -88,7 +115,7 @@ def text_draw(full_text: str, font: ImageFont,
         y = height * 0.5 - height_max
 
     for line in text_lines:
-        line_width = text_size(draw, line, font)[0]
+        line_width = text_size_cached(font, line)[0]
         if justify == EnumJustify.LEFT:
             x = margin
         elif justify == EnumJustify.RIGHT:
@@ -6,6 +6,7 @@ UTIL support
 import os
 import json
 import math
+import functools
 from enum import Enum
 from typing import Any, List, Generator, Optional, Tuple
 
@@ -15,6 +16,9 @@ from loguru import logger
 
 MIN_IMAGE_SIZE = 32
 
+# first characters json.loads can accept, anything else skips the (raising) probe
+JSON_START = frozenset('[{"\'-0123456789tfnNI')
+
 # ==============================================================================
 # === ENUMERATION ===
 # ==============================================================================
@@ -87,10 +91,15 @@ def grid_make(data: List[Any]) -> Tuple[List[List[Any]], int, int]:
         ret.append(d)
     return ret, cols, rows
 
+@functools.lru_cache(maxsize=256)
+def _load_file(fname: str, mtime: float) -> str:
+    # mtime is only part of the key, an edited file misses the cache
+    with open(fname, 'r', encoding='utf-8') as f:
+        return f.read()
+
 def load_file(fname: str) -> str | None:
     try:
-        with open(fname, 'r', encoding='utf-8') as f:
-            return f.read()
+        return _load_file(str(fname), os.path.getmtime(fname))
     except Exception as e:
         logger.error(e)
 
@@ -283,8 +292,9 @@ def parse_param(data:dict, key:str, typ:EnumConvertType, default: Any,
             val = val[0]
 
     if isinstance(val, (str,)):
-        try: val = json.loads(val.replace("'", '"'))
-        except json.JSONDecodeError: pass
+        if val.lstrip()[:1] in JSON_START:
+            try: val = json.loads(val.replace("'", '"'))
+            except json.JSONDecodeError: pass
     # see if we are a Jovimetrix hacked vector blob... {0:x, 1:y, 2:z, 3:w}
     elif isinstance(val, dict):
         # mixlab layer?
@@ -329,6 +339,12 @@ def parse_param(data:dict, key:str, typ:EnumConvertType, default: Any,
         val = [val]
     return [parse_value(v, typ, default, clip_min, clip_max, zero) for v in val]
 
+def parse_param_spec(data:dict, spec:Tuple[Tuple[Any, ...], ...]) -> List[Any]:
+    """First parsed value for every entry of a pre-built table of
+    `parse_param` arguments: (key, type, default[, min, max, zero]).
+    """
+    return [parse_param(data, *s)[0] for s in spec]
+
 def path_next(pattern: str) -> str:
     """
     Finds the next free path in an sequentially named list of files